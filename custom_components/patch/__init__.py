@@ -2,13 +2,18 @@
 
 from __future__ import annotations
 
+import asyncio
+import contextlib
 import datetime
+import functools
+import hashlib
+import os
+import shutil
+import tempfile
 from enum import StrEnum
 from pathlib import Path
 from typing import TYPE_CHECKING
 
-import aiofiles
-import aiofiles.os
 import homeassistant
 import homeassistant.config
 import homeassistant.core as ha
@@ -25,6 +30,7 @@ from homeassistant.exceptions import IntegrationError
 from homeassistant.helpers import config_validation as cv
 from homeassistant.helpers import event, recorder
 from homeassistant.helpers import issue_registry as ir
+from homeassistant.helpers.storage import Store
 
 from .const import (
     CONF_DESTINATION,
@@ -34,21 +40,30 @@ from .const import (
     DEFAULT_DELAY_SECONDS,
     DOMAIN,
     LOGGER,
+    MIGRATION_RETRY_DELAY,
     SERVICE_HOMEASSISTANT_RESTART,
+    STORAGE_KEY,
+    STORAGE_VERSION,
 )
 
 if TYPE_CHECKING:
     from homeassistant.helpers.typing import ConfigType
 
 PATH_VARIABLES = {
-    "site-packages": str(Path(aiofiles.__file__).parent.parent),
+    "site-packages": str(Path(homeassistant.__file__).parent.parent),
     "homeassistant": str(Path(homeassistant.__file__).parent),
 }
+PATH_SUBSTITUTIONS = tuple(
+    (f"{{{variable}}}", value) for variable, value in PATH_VARIABLES.items()
+)
 
 
+@functools.cache
 def expand_path(path: str) -> str:
     """Expand variables in path string."""
-    return path.format(**PATH_VARIABLES)
+    for variable, value in PATH_SUBSTITUTIONS:
+        path = path.replace(variable, value)
+    return path
 
 
 CONFIG_FILE_SCHEMA = vol.Schema(
@@ -62,11 +77,16 @@ CONFIG_FILE_SCHEMA = vol.Schema(
 )
 
 
-def validate_files(single_patch: dict[str, str]) -> dict[str, str]:
-    """Validate all files of a patch configuration."""
-    for dir_property in (CONF_BASE, CONF_DESTINATION, CONF_PATCH):
-        cv.isfile(Path(single_patch[dir_property]) / single_patch[CONF_NAME])
-    return single_patch
+def validate_files(patches: list[dict[str, str]]) -> list[dict[str, str]]:
+    """Validate all files of the patch configurations, checking each path once."""
+    validated: set[Path] = set()
+    for single_patch in patches:
+        for dir_property in (CONF_BASE, CONF_DESTINATION, CONF_PATCH):
+            path = Path(single_patch[dir_property]) / single_patch[CONF_NAME]
+            if path not in validated:
+                cv.isfile(path)
+                validated.add(path)
+    return patches
 
 
 CONFIG_SCHEMA = vol.Schema(
@@ -79,7 +99,7 @@ CONFIG_SCHEMA = vol.Schema(
                 ),
                 vol.Required(CONF_RESTART, default=True): cv.boolean,
                 vol.Optional(CONF_FILES): vol.All(
-                    cv.ensure_list, [CONFIG_FILE_SCHEMA], [validate_files]
+                    cv.ensure_list, [CONFIG_FILE_SCHEMA], validate_files
                 ),
             }
         )
@@ -101,8 +121,9 @@ async def async_setup(hass: HomeAssistant, config: ConfigType) -> bool:
 
     async def async_reload(_: ServiceCall) -> None:
         """Patch the core files using the new configuration."""
-        config = homeassistant.config.load_yaml_config_file(
-            hass.config.path(homeassistant.config.YAML_CONFIG_FILE)
+        config = await hass.async_add_executor_job(
+            homeassistant.config.load_yaml_config_file,
+            hass.config.path(homeassistant.config.YAML_CONFIG_FILE),
         )
         if DOMAIN not in config:
             message = (
@@ -110,19 +131,68 @@ async def async_setup(hass: HomeAssistant, config: ConfigType) -> bool:
                 f"{homeassistant.config.YAML_CONFIG_FILE}"
             )
             raise IntegrationError(message)
-        await Patch(hass, CONFIG_SCHEMA({DOMAIN: config[DOMAIN]})[DOMAIN]).run()
+        await hass.data[DOMAIN].reload(CONFIG_SCHEMA({DOMAIN: config[DOMAIN]})[DOMAIN])
 
+    hass.data[DOMAIN] = Patch(hass, config[DOMAIN])
     hass.services.async_register(DOMAIN, SERVICE_RELOAD, async_reload, vol.Schema({}))
 
+    if not config[DOMAIN].get(CONF_FILES):
+        return True
+
     event.async_track_point_in_time(
         hass,
-        Patch(hass, config[DOMAIN]).run_after_migration,
+        hass.data[DOMAIN].run_after_migration,
         dt_util.now() + datetime.timedelta(seconds=config[DOMAIN][CONF_DELAY]),
     )
 
     return True
 
 
+def file_digest(path: Path) -> bytes:
+    """Return the digest of a file's content, reading it in chunks."""
+    with path.open("rb", buffering=0) as file:
+        return hashlib.file_digest(
+            file, functools.partial(hashlib.blake2b, digest_size=32)
+        ).digest()
+
+
+def copy_file(source: Path, destination: Path) -> None:
+    """Atomically replace a file with a copy of another one, keeping its owner."""
+    # Replace the target of a symbolic link rather than the link itself.
+    destination = destination.resolve()
+    try:
+        fd, temp_name = tempfile.mkstemp(
+            prefix=f".{destination.name}.", dir=destination.parent
+        )
+    except PermissionError:
+        # The directory is read-only, so the file is rewritten in place.
+        shutil.copyfile(source, destination)
+        return
+    temp = Path(temp_name)
+    try:
+        # Uses a zero-copy system call (e.g. sendfile) where available.
+        shutil.copyfile(source, temp)
+        os.fsync(fd)
+        if hasattr(os, "posix_fadvise"):
+            os.posix_fadvise(fd, 0, 0, os.POSIX_FADV_DONTNEED)
+        stat = destination.stat()
+        with contextlib.suppress(PermissionError):
+            os.fchown(fd, stat.st_uid, stat.st_gid)
+        shutil.copymode(destination, temp)
+        temp.replace(destination)
+    except BaseException:
+        temp.unlink(missing_ok=True)
+        raise
+    finally:
+        os.close(fd)
+    # Persist the rename itself.
+    dir_fd = os.open(destination.parent, os.O_RDONLY)
+    try:
+        os.fsync(dir_fd)
+    finally:
+        os.close(dir_fd)
+
+
 class Patch:
     """Patch local files."""
 
@@ -130,6 +200,12 @@ class Patch:
         """Initialize the object."""
         self._hass = hass
         self._config = config
+        self._stat_results: dict[Path, asyncio.Future[os.stat_result]] = {}
+        self._digests: dict[Path, asyncio.Future[bytes]] = {}
+        self._stats: dict[Path, tuple[tuple[int, ...], bytes]] = {}
+        self._store: Store[dict[str, list]] = Store(hass, STORAGE_VERSION, STORAGE_KEY)
+        self._stored: dict[str, list] | None = None
+        self._lock = asyncio.Lock()
 
     @callback
     async def run_after_migration(self, _: datetime.datetime | None = None) -> None:
@@ -139,29 +215,80 @@ class Patch:
             event.async_track_point_in_time(
                 self._hass,
                 self.run_after_migration,
-                dt_util.now() + datetime.timedelta(minutes=1),
+                dt_util.now() + MIGRATION_RETRY_DELAY,
             )
         else:
             await self.run()
 
+    async def reload(self, config: ConfigType) -> None:
+        """Execute using a new configuration, computing all digests again."""
+        async with self._lock:
+            self._config = config
+            self._stats = {}
+            self._stored = {}
+            await self._store.async_remove()
+        await self.run()
+
     async def run(self) -> None:
-        """Execute."""
+        """Execute, one run at a time."""
+        async with self._lock:
+            await self._async_run()
+
+    async def _async_run(self) -> None:
+        """Patch the files of the current configuration."""
+        run_id = int(dt_util.now().timestamp())
+        files = self._config.get(CONF_FILES, ())
+        if self._stored is None:
+            await self._async_load_stats()
+        self._stat_results = {}
+        self._digests = {}
+        await asyncio.gather(
+            *(
+                self._stat(Path(file[directory]) / file[CONF_NAME])
+                for file in files
+                for directory in (CONF_BASE, CONF_DESTINATION, CONF_PATCH)
+            ),
+            return_exceptions=True,
+        )
+        # Let every patch finish, so no file is written after the run returns.
+        results = await asyncio.gather(
+            *(
+                self._patch(
+                    file[CONF_NAME],
+                    file[CONF_BASE],
+                    file[CONF_DESTINATION],
+                    file[CONF_PATCH],
+                )
+                for file in files
+            ),
+            return_exceptions=True,
+        )
         updates = 0
         base_mismatch = []
-        for file in self._config.get(CONF_FILES, []):
-            result = await self._patch(
-                file[CONF_NAME],
-                file[CONF_BASE],
-                file[CONF_DESTINATION],
-                file[CONF_PATCH],
-            )
+        errors = []
+        for file, result in zip(files, results, strict=True):
             match result:
                 case PatchResult.UPDATED:
                     updates += 1
                 case PatchResult.BASE_MISMATCH:
                     base_mismatch.append(file)
+                case BaseException():
+                    errors.append(result)
         if base_mismatch:
-            self._repair(base_mismatch)
+            LOGGER.error(
+                "Destination file is different than its base: %s."
+                if len(base_mismatch) == 1
+                else "Destination files are different than their base: %s.",
+                ", ".join(
+                    [
+                        f"'{Path(file[CONF_DESTINATION]) / file[CONF_NAME]}' "
+                        f"(base '{Path(file[CONF_BASE]) / file[CONF_NAME]}')"
+                        for file in base_mismatch
+                    ]
+                ),
+            )
+            self._repair(base_mismatch, run_id)
+        await self._async_save_stats()
         if updates > 0:
             LOGGER.warning(
                 f"{updates} core file {'s were' if updates > 1 else 'was'} patched."
@@ -171,6 +298,11 @@ class Patch:
                 await self._hass.services.async_call(
                     ha.DOMAIN, SERVICE_HOMEASSISTANT_RESTART
                 )
+        if len(errors) == 1:
+            raise errors[0]
+        if errors:
+            message = "Failed to patch files"
+            raise ExceptionGroup(message, errors)
 
     async def _patch(
         self,
@@ -183,28 +315,19 @@ class Patch:
         base = Path(base_directory) / name
         destination = Path(destination_directory) / name
         patch = Path(patch_directory) / name
-        async with aiofiles.open(base) as file:
-            base_content = await file.read()
-        async with aiofiles.open(destination) as file:
-            destination_content = await file.read()
-        async with aiofiles.open(patch) as file:
-            patch_content = await file.read()
-        if destination_content == patch_content:
+        if await self._identical(destination, patch):
             LOGGER.debug(
                 "Destination file '%s' is identical to the patch file '%s'.",
                 destination,
                 patch,
             )
             return PatchResult.IDENTICAL
-        if destination_content != base_content:
-            LOGGER.error(
-                "Destination file '%s' is different than its base '%s'.",
-                destination,
-                base,
-            )
+        if not await self._identical(destination, base):
             return PatchResult.BASE_MISMATCH
-        async with aiofiles.open(destination, "w") as file:
-            await file.write(patch_content)
+        await self._hass.async_add_executor_job(copy_file, patch, destination)
+        self._stat_results.pop(destination, None)
+        self._digests.pop(destination, None)
+        self._stats.pop(destination, None)
         LOGGER.warning(
             "Destination file '%s' was updated by the patch file '%s'.",
             destination,
@@ -212,9 +335,64 @@ class Patch:
         )
         return PatchResult.UPDATED
 
-    def _repair(self, files: list[dict[str, str]]) -> None:
+    async def _identical(self, first: Path, second: Path) -> bool:
+        """Check if two files have the same content, comparing their sizes first."""
+        if (await self._stat(first)).st_size != (await self._stat(second)).st_size:
+            return False
+        first_digest, second_digest = await asyncio.gather(
+            self._digest(first), self._digest(second)
+        )
+        return first_digest == second_digest
+
+    async def _stat(self, path: Path) -> os.stat_result:
+        """Return the status of a file, querying it at most once per run."""
+        if (stat := self._stat_results.get(path)) is None:
+            stat = self._stat_results[path] = self._hass.async_add_executor_job(
+                path.stat
+            )
+        return await stat
+
+    async def _digest(self, path: Path) -> bytes:
+        """Return the digest of a file, reusing it while the file is unchanged."""
+        stat = await self._stat(path)
+        key = (
+            stat.st_dev,
+            stat.st_ino,
+            stat.st_mtime_ns,
+            stat.st_ctime_ns,
+            stat.st_size,
+        )
+        if (cached := self._stats.get(path)) is not None and cached[0] == key:
+            return cached[1]
+        if (digest := self._digests.get(path)) is None:
+            digest = self._digests[path] = self._hass.async_add_executor_job(
+                file_digest, path
+            )
+        self._stats[path] = (key, await digest)
+        return self._stats[path][1]
+
+    async def _async_load_stats(self) -> None:
+        """Load the digests stored by previous runs."""
+        self._stored = await self._store.async_load() or {}
+        self._stats = {
+            Path(path): (tuple(key), bytes.fromhex(digest))
+            for path, (*key, digest) in self._stored.items()
+        }
+
+    async def _async_save_stats(self) -> None:
+        """Store the digests of the files used by this run, if they changed."""
+        stored = {
+            str(path): [*key, digest.hex()]
+            for path, (key, digest) in self._stats.items()
+            if path in self._stat_results
+        }
+        if stored != self._stored:
+            await self._store.async_save(stored)
+            self._stored = stored
+
+    def _repair(self, files: list[dict[str, str]], run_id: int) -> None:
         """Report an issue of base file mismatch."""
-        file_names = ", ".join(f'"{ file[CONF_NAME] }"' for file in files)
+        file_names = ", ".join([f'"{ file[CONF_NAME] }"' for file in files])
         message = (
             f"The file {file_names} is"
             if len(files) == 1
@@ -223,7 +401,7 @@ class Patch:
         ir.async_create_issue(
             self._hass,
             DOMAIN,
-            "patch_file_base_mismatch_" + str(int(dt_util.now().timestamp())),
+            f"patch_file_base_mismatch_{run_id}",
             is_fixable=False,
             learn_more_url="https://github.com/amitfin/patch#configuration",
             severity=ir.IssueSeverity.WARNING,
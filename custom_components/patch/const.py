@@ -1,5 +1,6 @@
 """Constants for the patch integration."""
 
+import datetime
 import logging
 from typing import Final
 
@@ -11,5 +12,9 @@ CONF_FILES = "files"
 CONF_PATCH = "patch"
 CONF_RESTART = "restart"
 DEFAULT_DELAY_SECONDS = 300
+MIGRATION_RETRY_DELAY: Final = datetime.timedelta(minutes=1)
+
+STORAGE_KEY: Final = DOMAIN
+STORAGE_VERSION: Final = 1
 
 SERVICE_HOMEASSISTANT_RESTART: Final = "restart"
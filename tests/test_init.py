@@ -2,15 +2,14 @@
 
 from __future__ import annotations
 
+import asyncio
 import datetime
+import hashlib
 import os
-import tempfile
-from pathlib import Path
-from typing import TYPE_CHECKING
-from unittest.mock import AsyncMock, Mock, patch
+from typing import TYPE_CHECKING, Any
+from unittest.mock import Mock, patch
 
 import homeassistant.core as ha
-import homeassistant.util.dt as dt_util
 import pytest
 import voluptuous as vol
 import voluptuous.error as vol_error
@@ -21,16 +20,20 @@ from homeassistant.const import (
     CONF_NAME,
     SERVICE_RELOAD,
 )
-from homeassistant.core import HomeAssistant, ServiceCall, callback
 from homeassistant.exceptions import IntegrationError
 from homeassistant.helpers import issue_registry as ir
 from homeassistant.setup import async_setup_component
 from pytest_homeassistant_custom_component.common import (
-    async_capture_events,
     async_fire_time_changed,
+    async_mock_service,
 )
 
-from custom_components.patch import expand_path
+from custom_components.patch import (
+    CONFIG_SCHEMA,
+    copy_file,
+    expand_path,
+    file_digest,
+)
 from custom_components.patch.const import (
     CONF_DESTINATION,
     CONF_FILES,
@@ -39,13 +42,117 @@ from custom_components.patch.const import (
     DEFAULT_DELAY_SECONDS,
     DOMAIN,
     SERVICE_HOMEASSISTANT_RESTART,
+    STORAGE_KEY,
+    STORAGE_VERSION,
 )
 
 if TYPE_CHECKING:
+    from collections.abc import Callable
+    from pathlib import Path
+
     from freezegun.api import FrozenDateTimeFactory
+    from homeassistant.core import HomeAssistant, ServiceCall
     from homeassistant.helpers.typing import ConfigType
 
 
+IDENTICAL_FILES_CONFIG = {
+    CONF_FILES: [
+        {
+            CONF_NAME: "__init__.py",
+            CONF_BASE: "{homeassistant}",
+            CONF_DESTINATION: "{homeassistant}",
+            CONF_PATCH: "{homeassistant}",
+        }
+    ]
+}
+
+EMPTY_SCHEMA = vol.Schema({})
+
+STAT_FIELDS = ("st_dev", "st_ino", "st_mtime_ns", "st_ctime_ns", "st_size")
+
+EXPAND_PATH_CONFIG = yaml.safe_load(
+    """
+    files:
+      - name: __init__.py
+        base: "{site-packages}/homeassistant"
+        destination: "{site-packages}/homeassistant"
+        patch: "{site-packages}/homeassistant"
+      - name: __init__.py
+        base: "{homeassistant}"
+        destination: "{homeassistant}"
+        patch: "{homeassistant}"
+    """
+)
+
+
+@pytest.fixture(scope="module")
+def patch_dirs(tmp_path_factory: pytest.TempPathFactory) -> tuple[Path, Path, Path]:
+    """Create the base, destination and patch directories once per module."""
+    root = tmp_path_factory.mktemp("patch")
+    directories = (root / "base", root / "destination", root / "patch")
+    for directory in directories:
+        directory.mkdir()
+    return directories
+
+
+@pytest.fixture
+def now(freezer: FrozenDateTimeFactory) -> datetime.datetime:
+    """Freeze the time at a fixed point and return it."""
+    frozen = datetime.datetime.fromisoformat("2000-01-01")
+    freezer.move_to(frozen)
+    return frozen
+
+
+@pytest.fixture
+async def restart_calls(hass: HomeAssistant) -> list[ServiceCall]:
+    """Mock the core restart service and return its calls."""
+    return async_mock_service(
+        hass, ha.DOMAIN, SERVICE_HOMEASSISTANT_RESTART, EMPTY_SCHEMA
+    )
+
+
+@pytest.fixture
+def yaml_config(monkeypatch: pytest.MonkeyPatch) -> Callable[[ConfigType], None]:
+    """Return a setter of the configuration read by the reload service."""
+
+    def set_config(config: ConfigType) -> None:
+        monkeypatch.setattr(
+            "homeassistant.config.load_yaml_config_file", lambda _: config
+        )
+
+    return set_config
+
+
+def stage_file(path: Path, content: str) -> None:
+    """Write a test file with ASCII content."""
+    path.write_bytes(content.encode("ascii"))
+
+
+def stat_key(path: Path) -> list[int]:
+    """Return the stored status fields of a file."""
+    stat = path.stat()
+    return [getattr(stat, field) for field in STAT_FIELDS]
+
+
+def single_file_config(
+    base: str | Path,
+    destination: str | Path,
+    patch_dir: str | Path,
+    name: str = "file",
+) -> ConfigType:
+    """Return a configuration patching a single file."""
+    return {
+        CONF_FILES: [
+            {
+                CONF_NAME: name,
+                CONF_BASE: str(base),
+                CONF_DESTINATION: str(destination),
+                CONF_PATCH: str(patch_dir),
+            }
+        ]
+    }
+
+
 async def async_setup(hass: HomeAssistant, config: ConfigType | None = None) -> None:
     """Load patch custom integration."""
     assert await async_setup_component(
@@ -53,14 +160,13 @@ async def async_setup(hass: HomeAssistant, config: ConfigType | None = None) ->
         DOMAIN,
         {DOMAIN: config or {}},
     )
-    await hass.async_block_till_done(wait_background_tasks=True)
 
 
 async def async_next_minutes(
     hass: HomeAssistant, freezer: FrozenDateTimeFactory, minutes: float = 1
 ) -> None:
     """Jump to the next minutes and execute all pending timers."""
-    freezer.move_to(dt_util.now() + datetime.timedelta(minutes=minutes))
+    freezer.tick(datetime.timedelta(minutes=minutes))
     async_fire_time_changed(hass)
     await hass.async_block_till_done(wait_background_tasks=True)
 
@@ -70,12 +176,24 @@ async def async_next_day(hass: HomeAssistant, freezer: FrozenDateTimeFactory) ->
     await async_next_minutes(hass, freezer, 60 * 24)
 
 
+async def async_next_delay(
+    hass: HomeAssistant,
+    freezer: FrozenDateTimeFactory,
+    seconds: float = DEFAULT_DELAY_SECONDS + 1,
+) -> None:
+    """Jump past the patching delay and execute all pending timers."""
+    await async_next_minutes(hass, freezer, seconds / 60)
+
+
+@patch("homeassistant.helpers.event.async_track_point_in_time")
 async def test_empty_config(
-    hass: HomeAssistant, freezer: FrozenDateTimeFactory
+    async_track_point_in_time_mock: Mock,
+    hass: HomeAssistant,
 ) -> None:
     """Test empty configuration."""
     await async_setup(hass)
-    await async_next_day(hass, freezer)
+    assert async_track_point_in_time_mock.call_count == 0
+    assert hass.services.has_service(DOMAIN, SERVICE_RELOAD)
 
 
 @pytest.mark.parametrize(
@@ -87,23 +205,26 @@ async def test_empty_config(
 async def test_delay(
     async_track_point_in_time_mock: Mock,
     hass: HomeAssistant,
-    freezer: FrozenDateTimeFactory,
+    now: datetime.datetime,
     delay: int | None,
     expected_delay: int,
 ) -> None:
     """Test empty configuration."""
-    now = datetime.datetime.fromisoformat("2000-01-01")
-    freezer.move_to(now)
-    await async_setup(hass, {CONF_DELAY: delay} if delay is not None else None)
-    await async_next_day(hass, freezer)
+    await async_setup(
+        hass,
+        {**IDENTICAL_FILES_CONFIG, CONF_DELAY: delay}
+        if delay is not None
+        else IDENTICAL_FILES_CONFIG,
+    )
     assert async_track_point_in_time_mock.call_count == 1
     assert (
         async_track_point_in_time_mock.call_args[0][2].timestamp()
         == (now + datetime.timedelta(seconds=expected_delay)).timestamp()
     )
+    await async_track_point_in_time_mock.call_args[0][1]()
+    assert async_track_point_in_time_mock.call_count == 1
 
 
-@patch("homeassistant.core.ServiceRegistry.async_call")
 @pytest.mark.parametrize(
     ("base_content", "destination_content", "patch_content", "update", "restart"),
     [
@@ -111,14 +232,24 @@ async def test_delay(
         ("old", "old", "new", True, False),
         ("def", "abc", "abc", False, True),
         ("abc", "def", "ghi", False, True),
+        ("old", "old", "newer", True, True),
+        ("old", "older", "new", False, True),
+    ],
+    ids=[
+        "update",
+        "update no restart",
+        "identical",
+        "different base",
+        "update different size",
+        "different base size",
     ],
-    ids=["update", "update no restart", "identical", "different base"],
 )
 async def test_patch(  # noqa: PLR0913
-    async_call_mock: AsyncMock,
     hass: HomeAssistant,
+    restart_calls: list[ServiceCall],
     freezer: FrozenDateTimeFactory,
     caplog: pytest.LogCaptureFixture,
+    patch_dirs: tuple[Path, Path, Path],
     base_content: str,
     destination_content: str,
     patch_content: str,
@@ -126,173 +257,329 @@ async def test_patch(  # noqa: PLR0913
     restart: bool,  # noqa: FBT001
 ) -> None:
     """Test updating a file."""
-    repairs = async_capture_events(hass, ir.EVENT_REPAIRS_ISSUE_REGISTRY_UPDATED)
-    with (
-        tempfile.TemporaryDirectory() as base,
-        tempfile.TemporaryDirectory() as destination,
-        tempfile.TemporaryDirectory() as patch_dir,
-    ):
-        with (Path(base) / "file").open("w", encoding="ascii") as file:
-            file.write(base_content)
-        with (Path(destination) / "file").open("w", encoding="ascii") as file:
-            file.write(destination_content)
-        with (Path(patch_dir) / "file").open("w", encoding="ascii") as file:
-            file.write(patch_content)
-        await async_setup(
-            hass,
-            {
-                CONF_RESTART: restart,
-                CONF_FILES: [
-                    {
-                        CONF_NAME: "file",
-                        CONF_BASE: base,
-                        CONF_DESTINATION: destination,
-                        CONF_PATCH: patch_dir,
-                    }
-                ],
-            },
-        )
-        await async_next_day(hass, freezer)
-        with (Path(destination) / "file").open(encoding="ascii") as file:
-            assert file.read() == (
-                patch_content
-                if base_content == destination_content
-                else destination_content
-            )
-    assert async_call_mock.call_count == (1 if update and restart else 0)
-    assert len(repairs) == (
+    base, destination, patch_dir = patch_dirs
+    stage_file(base / "file", base_content)
+    stage_file(destination / "file", destination_content)
+    stage_file(patch_dir / "file", patch_content)
+    await async_setup(
+        hass,
+        {
+            CONF_RESTART: restart,
+            **single_file_config(base, destination, patch_dir),
+        },
+    )
+    await async_next_delay(hass, freezer)
+    assert (destination / "file").read_bytes() == (
+        patch_content if base_content == destination_content else destination_content
+    ).encode("ascii")
+    assert len(restart_calls) == (1 if update and restart else 0)
+    issues = list(ir.async_get(hass).issues)
+    assert len(issues) == (
         1 if not update and destination_content != patch_content else 0
     )
     if update:
         assert "was updated by the patch file" in caplog.text
         assert "1 core file was patched." in caplog.text
         if restart:
-            assert async_call_mock.await_args_list[0].args[0] == ha.DOMAIN
-            assert (
-                async_call_mock.await_args_list[0].args[1]
-                == SERVICE_HOMEASSISTANT_RESTART
-            )
+            assert restart_calls[0].domain == ha.DOMAIN
+            assert restart_calls[0].service == SERVICE_HOMEASSISTANT_RESTART
             assert "Restarting HA core." in caplog.text
     elif destination_content == patch_content:
         assert "is identical to the patch file" in caplog.text
     else:
-        assert "is different than its base" in caplog.text
-        assert repairs[0].data["action"] == "create"
-        assert repairs[0].data["domain"] == DOMAIN
-        assert repairs[0].data["issue_id"].startswith("patch_file_base_mismatch")
+        assert "Destination file is different than its base" in caplog.text
+        assert issues[0][0] == DOMAIN
+        assert issues[0][1].startswith("patch_file_base_mismatch")
 
 
-async def test_reload(
+async def test_shared_files(
     hass: HomeAssistant,
+    restart_calls: list[ServiceCall],
     freezer: FrozenDateTimeFactory,
+    tmp_path: Path,
 ) -> None:
-    """Test reload service."""
-    await async_setup(hass)
-    await async_next_day(hass, freezer)
-    core_reload_calls = []
-
-    @callback
-    async def async_core_reload_mock(service_call: ServiceCall) -> None:
-        """Mock for core reload."""
-        core_reload_calls.append(service_call)
-
-    hass.services.async_register(
-        ha.DOMAIN,
-        SERVICE_HOMEASSISTANT_RESTART,
-        async_core_reload_mock,
-        vol.Schema({}),
-    )
-
-    with (
-        tempfile.TemporaryDirectory() as base,
-        tempfile.TemporaryDirectory() as destination,
-        tempfile.TemporaryDirectory() as patch_dir,
+    """Test files shared by multiple patches are read once."""
+    base = tmp_path / "base"
+    destinations = (tmp_path / "destination1", tmp_path / "destination2")
+    patch_dir = tmp_path / "patch"
+    for directory, content in (
+        (base, "old"),
+        (destinations[0], "old"),
+        (destinations[1], "old"),
+        (patch_dir, "new"),
     ):
-        with (Path(base) / "file").open("w", encoding="ascii") as file:
-            file.write("123")
-        with (Path(destination) / "file").open("w", encoding="ascii") as file:
-            file.write("123")
-        with (Path(patch_dir) / "file").open("w", encoding="ascii") as file:
-            file.write("456")
-        with patch(
-            "homeassistant.config.load_yaml_config_file",
-            return_value={
-                DOMAIN: {
-                    CONF_FILES: [
-                        {
-                            CONF_NAME: "file",
-                            CONF_BASE: base,
-                            CONF_DESTINATION: destination,
-                            CONF_PATCH: patch_dir,
-                        }
-                    ]
-                }
+        directory.mkdir()
+        stage_file(directory / "file", content)
+    with patch(
+        "custom_components.patch.file_digest", wraps=file_digest
+    ) as file_digest_mock:
+        await async_setup(
+            hass,
+            {
+                CONF_FILES: [
+                    {
+                        CONF_NAME: "file",
+                        CONF_BASE: str(base),
+                        CONF_DESTINATION: str(destination),
+                        CONF_PATCH: str(patch_dir),
+                    }
+                    for destination in destinations
+                ],
             },
-        ):
-            await hass.services.async_call(DOMAIN, SERVICE_RELOAD, blocking=True)
-            await hass.async_block_till_done(wait_background_tasks=True)
-        with (Path(destination) / "file").open(encoding="ascii") as file:
-            assert file.read() == "456"
-    assert len(core_reload_calls) == 1
+        )
+        await async_next_delay(hass, freezer)
+    for destination in destinations:
+        assert (destination / "file").read_bytes() == b"new"
+    assert file_digest_mock.call_count == 4
+    assert len(restart_calls) == 1
 
 
-async def test_reload_no_config(
+async def test_patch_error(
     hass: HomeAssistant,
-    freezer: FrozenDateTimeFactory,
+    restart_calls: list[ServiceCall],
+    hass_storage: dict[str, Any],
+    yaml_config: Callable[[ConfigType], None],
+    tmp_path: Path,
 ) -> None:
-    """Test reload service with no configuration."""
+    """Test a failing file doesn't stop the other patches."""
+    base = tmp_path / "base"
+    destinations = (tmp_path / "destination1", tmp_path / "destination2")
+    patch_dir = tmp_path / "patch"
+    for directory, content in (
+        (base, "old"),
+        (destinations[0], "old"),
+        (destinations[1], "old"),
+        (patch_dir, "new"),
+    ):
+        directory.mkdir()
+        stage_file(directory / "file", content)
+
+    def copy_file_mock(source: Path, destination: Path) -> None:
+        if destination.parent == destinations[1]:
+            raise PermissionError
+        copy_file(source, destination)
+
     await async_setup(hass)
-    await async_next_day(hass, freezer)
+    yaml_config(
+        {
+            DOMAIN: {
+                CONF_FILES: [
+                    {
+                        CONF_NAME: "file",
+                        CONF_BASE: str(base),
+                        CONF_DESTINATION: str(destination),
+                        CONF_PATCH: str(patch_dir),
+                    }
+                    for destination in destinations
+                ],
+            }
+        }
+    )
     with (
-        patch(
-            "homeassistant.config.load_yaml_config_file",
-            return_value={},
-        ),
-        pytest.raises(IntegrationError),
+        patch("custom_components.patch.copy_file", side_effect=copy_file_mock),
+        pytest.raises(PermissionError),
     ):
         await hass.services.async_call(DOMAIN, SERVICE_RELOAD, blocking=True)
+    await hass.async_block_till_done(wait_background_tasks=True)
+    assert (destinations[0] / "file").read_bytes() == b"new"
+    assert (destinations[1] / "file").read_bytes() == b"old"
+    assert len(restart_calls) == 1
+    assert str(patch_dir / "file") in hass_storage[STORAGE_KEY]["data"]
+
+
+async def test_stored_digests(
+    hass: HomeAssistant,
+    restart_calls: list[ServiceCall],
+    hass_storage: dict[str, Any],
+    freezer: FrozenDateTimeFactory,
+    tmp_path: Path,
+) -> None:
+    """Test digests of unchanged files are taken from the storage."""
+    base = tmp_path / "base"
+    destination = tmp_path / "destination"
+    patch_dir = tmp_path / "patch"
+    for directory, content in (
+        (base, "old"),
+        (destination, "abc"),
+        (patch_dir, "xyz"),
+    ):
+        directory.mkdir()
+        stage_file(directory / "file", content)
+    stored = {}
+    for path in (destination / "file", patch_dir / "file"):
+        stored[str(path)] = [*stat_key(path), "00" * 32]
+    hass_storage[STORAGE_KEY] = {
+        "version": STORAGE_VERSION,
+        "minor_version": 1,
+        "key": STORAGE_KEY,
+        "data": stored,
+    }
+    await async_setup(hass, single_file_config(base, destination, patch_dir))
+    await async_next_delay(hass, freezer)
+    assert (destination / "file").read_bytes() == b"abc"
+    assert len(restart_calls) == 0
+    assert hass_storage[STORAGE_KEY]["data"] == stored
+
+
+@pytest.mark.parametrize("field", STAT_FIELDS)
+async def test_stale_stored_digests(  # noqa: PLR0913
+    hass: HomeAssistant,
+    restart_calls: list[ServiceCall],
+    hass_storage: dict[str, Any],
+    freezer: FrozenDateTimeFactory,
+    patch_dirs: tuple[Path, Path, Path],
+    field: str,
+) -> None:
+    """Test stored digests of changed files are ignored."""
+    base, destination, patch_dir = patch_dirs
+    stage_file(base / "file", "old")
+    stage_file(destination / "file", "old")
+    stage_file(patch_dir / "file", "new")
+    stored = {}
+    for path in (destination / "file", patch_dir / "file"):
+        key = stat_key(path)
+        key[STAT_FIELDS.index(field)] += 1
+        stored[str(path)] = [*key, "00" * 32]
+    hass_storage[STORAGE_KEY] = {
+        "version": STORAGE_VERSION,
+        "minor_version": 1,
+        "key": STORAGE_KEY,
+        "data": stored,
+    }
+    await async_setup(hass, single_file_config(base, destination, patch_dir))
+    await async_next_delay(hass, freezer)
+    assert (destination / "file").read_bytes() == b"new"
+    assert len(restart_calls) == 1
+
+
+async def test_saved_digests(
+    hass: HomeAssistant,
+    hass_storage: dict[str, Any],
+    freezer: FrozenDateTimeFactory,
+    patch_dirs: tuple[Path, Path, Path],
+) -> None:
+    """Test the digests saved after an update."""
+    base, destination, patch_dir = patch_dirs
+    stage_file(base / "file", "old")
+    stage_file(destination / "file", "old")
+    stage_file(patch_dir / "file", "new")
+    await async_setup(
+        hass,
+        {CONF_RESTART: False, **single_file_config(base, destination, patch_dir)},
+    )
+    await async_next_delay(hass, freezer)
+    assert (destination / "file").read_bytes() == b"new"
+    assert hass_storage[STORAGE_KEY]["data"] == {
+        str(path): [*stat_key(path), file_digest(path).hex()]
+        for path in (base / "file", patch_dir / "file")
+    }
+
+
+async def test_reload(
+    hass: HomeAssistant,
+    restart_calls: list[ServiceCall],
+    yaml_config: Callable[[ConfigType], None],
+    patch_dirs: tuple[Path, Path, Path],
+) -> None:
+    """Test reload service."""
+    await async_setup(hass)
+    base, destination, patch_dir = patch_dirs
+    stage_file(base / "file", "123")
+    stage_file(destination / "file", "123")
+    stage_file(patch_dir / "file", "456")
+    yaml_config({DOMAIN: single_file_config(base, destination, patch_dir)})
+    await hass.services.async_call(DOMAIN, SERVICE_RELOAD, blocking=True)
+    await hass.async_block_till_done(wait_background_tasks=True)
+    assert (destination / "file").read_bytes() == b"456"
+    assert len(restart_calls) == 1
+
+
+async def test_reload_stored_digests(
+    hass: HomeAssistant,
+    restart_calls: list[ServiceCall],
+    hass_storage: dict[str, Any],
+    yaml_config: Callable[[ConfigType], None],
+    patch_dirs: tuple[Path, Path, Path],
+) -> None:
+    """Test reload service computes all digests again."""
+    base, destination, patch_dir = patch_dirs
+    stage_file(base / "file", "old")
+    stage_file(destination / "file", "old")
+    stage_file(patch_dir / "file", "new")
+    hass_storage[STORAGE_KEY] = {
+        "version": STORAGE_VERSION,
+        "minor_version": 1,
+        "key": STORAGE_KEY,
+        "data": {
+            str(path): [*stat_key(path), "00" * 32]
+            for path in (destination / "file", patch_dir / "file")
+        },
+    }
+    await async_setup(hass)
+    yaml_config({DOMAIN: single_file_config(base, destination, patch_dir)})
+    await hass.services.async_call(DOMAIN, SERVICE_RELOAD, blocking=True)
+    await hass.async_block_till_done(wait_background_tasks=True)
+    assert (destination / "file").read_bytes() == b"new"
+    assert len(restart_calls) == 1
+
+
+@patch("homeassistant.helpers.event.async_track_point_in_time")
+async def test_reload_during_run(
+    async_track_point_in_time_mock: Mock,
+    hass: HomeAssistant,
+    restart_calls: list[ServiceCall],
+    yaml_config: Callable[[ConfigType], None],
+    patch_dirs: tuple[Path, Path, Path],
+) -> None:
+    """Test reload service waits for a run in progress."""
+    base, destination, patch_dir = patch_dirs
+    stage_file(base / "file", "old")
+    stage_file(destination / "file", "old")
+    stage_file(patch_dir / "file", "new")
+    config = single_file_config(base, destination, patch_dir)
+    await async_setup(hass, config)
+    assert async_track_point_in_time_mock.call_count == 1
+    yaml_config({DOMAIN: config})
+    with patch("custom_components.patch.copy_file", wraps=copy_file) as copy_file_mock:
+        await asyncio.gather(
+            hass.data[DOMAIN].run(),
+            hass.services.async_call(DOMAIN, SERVICE_RELOAD, blocking=True),
+        )
+        await hass.async_block_till_done(wait_background_tasks=True)
+    assert (destination / "file").read_bytes() == b"new"
+    assert copy_file_mock.call_count == 1
+    assert len(restart_calls) == 1
 
 
 @pytest.mark.parametrize(
-    ("name", "base", "destination", "patch_dir", "error"),
+    ("config", "exception", "error"),
     [
-        ("test", ".", ".", ".", "not a file"),
-        ("test", "dummy", ".", ".", "not a directory"),
+        ({}, IntegrationError, "section was not found"),
+        (
+            {DOMAIN: single_file_config(".", ".", ".", "test")},
+            vol_error.MultipleInvalid,
+            "not a file",
+        ),
+        (
+            {DOMAIN: single_file_config("dummy", ".", ".", "test")},
+            vol_error.MultipleInvalid,
+            "not a directory",
+        ),
     ],
-    ids=["no file", "no directory"],
+    ids=["no config", "no file", "no directory"],
 )
-async def test_invalid_config(  # noqa: PLR0913
+async def test_invalid_config(
     hass: HomeAssistant,
-    freezer: FrozenDateTimeFactory,
-    name: str,
-    base: str,
-    destination: str,
-    patch_dir: str,
+    yaml_config: Callable[[ConfigType], None],
+    config: ConfigType,
+    exception: type[Exception],
     error: str,
 ) -> None:
-    """Test file doesn't exist."""
+    """Test reload service with a missing or invalid configuration."""
     await async_setup(hass)
-    await async_next_day(hass, freezer)
-    with (
-        patch(
-            "homeassistant.config.load_yaml_config_file",
-            return_value={
-                DOMAIN: {
-                    CONF_FILES: [
-                        {
-                            CONF_NAME: name,
-                            CONF_BASE: base,
-                            CONF_DESTINATION: destination,
-                            CONF_PATCH: patch_dir,
-                        }
-                    ]
-                }
-            },
-        ),
-        pytest.raises(vol_error.MultipleInvalid) as err,
-    ):
+    yaml_config(config)
+    with pytest.raises(exception, match=error):
         await hass.services.async_call(DOMAIN, SERVICE_RELOAD, blocking=True)
-    assert error in str(err.value)
 
 
 async def test_no_delay(
@@ -300,6 +587,7 @@ async def test_no_delay(
 ) -> None:
     """Test no delay."""
     await async_setup(hass, {CONF_DELAY: 0})
+    await hass.async_block_till_done(wait_background_tasks=True)
 
 
 async def test_negative_delay(
@@ -317,30 +605,88 @@ def test_expand_path() -> None:
     """Test path with variables."""
     for variable in ["site-packages", "homeassistant"]:
         assert expand_path(f"{{{variable}}}").endswith(f"{os.path.sep}{variable}")
+    assert expand_path("/config/{unknown}") == "/config/{unknown}"
+
+
+def test_validation_not_cached(tmp_path: Path) -> None:
+    """Test a file removed after a validation fails the next one."""
+    stage_file(tmp_path / "file", "abc")
+    config = {DOMAIN: single_file_config(tmp_path, tmp_path, tmp_path)}
+    CONFIG_SCHEMA(config)
+    (tmp_path / "file").unlink()
+    with pytest.raises(vol_error.MultipleInvalid, match="not a file"):
+        CONFIG_SCHEMA(config)
+
+
+def test_copy_file(tmp_path: Path) -> None:
+    """Test replacing a file keeps its mode and leaves no temporary file."""
+    source = tmp_path / "source"
+    destination = tmp_path / "destination"
+    for directory in (source, destination):
+        directory.mkdir()
+    (source / "file").write_bytes(b"new")
+    (destination / "file").write_bytes(b"old")
+    (destination / "file").chmod(0o640)
+    copy_file(source / "file", destination / "file")
+    assert (destination / "file").read_bytes() == b"new"
+    assert (destination / "file").stat().st_mode & 0o777 == 0o640
+    assert [path.name for path in destination.iterdir()] == ["file"]
+
+
+@pytest.mark.skipif(os.geteuid() != 0, reason="changing owners requires root")
+def test_copy_file_owner(tmp_path: Path) -> None:
+    """Test replacing a file keeps its owner and group."""
+    stage_file(tmp_path / "source", "new")
+    stage_file(tmp_path / "file", "old")
+    os.chown(tmp_path / "file", 1234, 5678)
+    copy_file(tmp_path / "source", tmp_path / "file")
+    assert (tmp_path / "file").read_bytes() == b"new"
+    assert (tmp_path / "file").stat().st_uid == 1234
+    assert (tmp_path / "file").stat().st_gid == 5678
+
+
+def test_copy_file_read_only_directory(tmp_path: Path) -> None:
+    """Test a file in a read-only directory is rewritten in place."""
+    stage_file(tmp_path / "source", "new")
+    stage_file(tmp_path / "file", "old")
+    inode = (tmp_path / "file").stat().st_ino
+    tmp_path.chmod(0o555)
+    try:
+        # Root ignores directory permissions, so also fail the temporary file.
+        with patch("tempfile.mkstemp", side_effect=PermissionError):
+            copy_file(tmp_path / "source", tmp_path / "file")
+    finally:
+        tmp_path.chmod(0o755)
+    assert (tmp_path / "file").read_bytes() == b"new"
+    assert (tmp_path / "file").stat().st_ino == inode
+
+
+def test_copy_file_symlink(tmp_path: Path) -> None:
+    """Test replacing a symbolic link destination updates its target."""
+    stage_file(tmp_path / "source", "new")
+    stage_file(tmp_path / "real", "old")
+    (tmp_path / "link").symlink_to(tmp_path / "real")
+    copy_file(tmp_path / "source", tmp_path / "link")
+    assert (tmp_path / "link").is_symlink()
+    assert (tmp_path / "real").read_bytes() == b"new"
+
+
+def test_file_digest(tmp_path: Path) -> None:
+    """Test digest of a file larger than the read buffer."""
+    content = os.urandom(1024 * 1024 + 1)
+    path = tmp_path / "file"
+    path.write_bytes(content)
+    assert file_digest(path) == hashlib.blake2b(content, digest_size=32).digest()
+    path.write_bytes(content[:-1])
+    assert file_digest(path) != hashlib.blake2b(content, digest_size=32).digest()
 
 
 async def test_expand_path_config(
     hass: HomeAssistant, freezer: FrozenDateTimeFactory
 ) -> None:
     """Test configuration with variables."""
-    await async_setup(
-        hass,
-        yaml.load(
-            """
-            files:
-              - name: __init__.py
-                base: "{site-packages}/homeassistant"
-                destination: "{site-packages}/homeassistant"
-                patch: "{site-packages}/homeassistant"
-              - name: __init__.py
-                base: "{homeassistant}"
-                destination: "{homeassistant}"
-                patch: "{homeassistant}"
-            """,
-            Loader=yaml.SafeLoader,
-        ),
-    )
-    await async_next_day(hass, freezer)
+    await async_setup(hass, EXPAND_PATH_CONFIG)
+    await async_next_delay(hass, freezer)
 
 
 @patch("homeassistant.helpers.recorder.async_migration_in_progress")
@@ -355,7 +701,7 @@ async def test_wait_for_recorder_migration(
     def _delay_count(log: str) -> int:
         return log.count("Recorder migration in progress. Checking again in a minute.")
 
-    await async_setup(hass)
+    await async_setup(hass, IDENTICAL_FILES_CONFIG)
     async_migration_in_progress_mock.return_value = True
     await async_next_minutes(hass, freezer, DEFAULT_DELAY_SECONDS / 60)
     assert _delay_count(caplog.text) == 1